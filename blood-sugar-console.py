@@ -1,97 +1,254 @@
 import os
-import logging
+import bisect
+import json
+import re
+import signal
 import sys
+import threading
 import time
 import pyfiglet
-from apscheduler.schedulers.background import BackgroundScheduler
+from functools import lru_cache
 from colorama import Fore, Style, init
 from datetime import datetime
 from dotenv import load_dotenv
 from libreview_api import LibreViewAPI, LibreViewAPIError
+from local_cache import CACHE_DIR, write_private_json
+from typing import NamedTuple
 from zoneinfo import ZoneInfo
 
-init(autoreset=True) 
+# Frames are written in a single call and flushed explicitly, so don't flush on every newline.
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(line_buffering=False, write_through=False)
+
+# Frame.render() ends each frame with its own reset, so colorama's autoreset (an extra reset
+# write after every write) isn't needed; init() still converts the escapes on legacy Windows consoles.
+init()
 
 load_dotenv() # This loads variables from .env into os.environ
 
 EMAIL = os.getenv("LIBRE_FREESYTLE_EMAIL", "")
 PASSWORD = os.getenv("LIBRE_FREESYTLE_PASSWORD", "")
 
-api = LibreViewAPI(EMAIL, PASSWORD)
+REFRESH_INTERVAL_SECONDS = 300
+LAST_GRAPH_DATA_PATH = os.path.join(CACHE_DIR, "last.json")
 
-logging.getLogger('apscheduler').setLevel(logging.WARNING)
+latest_reading = None
+status_message = None
+refresh_timer = None
+stop_event = threading.Event()
+render_lock = threading.Lock()
+resize_event = threading.Event()
+cached_terminal_width = 80
 
-graph_data = None
+UTC = ZoneInfo("UTC")
+CST = ZoneInfo("America/Chicago")
+# The hour only accepts 1-12 like '%I'; anything else falls back to strptime and fails there.
+FACTORY_TIMESTAMP_RE = re.compile(r'(\d+)/(\d+)/(\d+) (1[0-2]|0?[1-9]):(\d+):(\d+) (AM|PM)')
 
-def clear_console():
-    os.system('cls' if os.name == 'nt' else 'clear')
+# figlet_format() builds a new Figlet (and parses its font) on every call, so keep one per font.
+TITLE_FIGLET = pyfiglet.Figlet(font="small")
+VALUE_FIGLET = pyfiglet.Figlet(font="big")
 
-def get_terminal_width():
+TITLE = TITLE_FIGLET.renderText("Blood Sugar Console")
+
+@lru_cache(maxsize=256)
+def render_value(value):
+    return VALUE_FIGLET.renderText(str(value))
+
+# Clear the screen and scrollback, then home the cursor. On legacy Windows consoles colorama
+# translates the erase/home sequences into console API calls and drops the unsupported 3J.
+CLEAR_SCREEN = "\x1b[2J\x1b[3J\x1b[H"
+
+# The width is cached and only refreshed on SIGWINCH (or once per poll where that signal doesn't
+# exist), rather than querying the terminal on every render.
+def update_terminal_width():
+    global cached_terminal_width
     try:
-        return os.get_terminal_size().columns
+        cached_terminal_width = os.get_terminal_size().columns
     except OSError:
-        return 80
+        pass
+
+def get_terminal_width():
+    return cached_terminal_width
+
+# The handler only wakes the resize thread: it may have interrupted a frame being written on the
+# main thread, and a burst of signals while dragging a window edge collapses into one redraw.
+def handle_resize(signum, stack_frame):
+    resize_event.set()
+
+def redraw_on_resize():
+    while True:
+        resize_event.wait()
+        resize_event.clear()
+        update_terminal_width()
+        print_blood_sugar()
+
+# Readings are whole mg/dL values, so each threshold is the first value of its band:
+# < 70 low, 70-79 borderline low, 80-180 in range, 181-200 borderline high, > 200 high.
+BLOOD_SUGAR_THRESHOLDS = (70, 80, 181, 201)
+BLOOD_SUGAR_COLORS = (Fore.RED, Fore.YELLOW, Fore.GREEN, Fore.YELLOW, Fore.RED)
 
 def get_blood_sugar_color(value):
-    if value > 200:
-        return Fore.RED
-    elif value > 180:
-        return Fore.YELLOW  
-    elif 80 <= value <= 180:
-        return Fore.GREEN
-    elif 70 <= value < 80:
-        return Fore.YELLOW  
+    return BLOOD_SUGAR_COLORS[bisect.bisect_right(BLOOD_SUGAR_THRESHOLDS, value)]
+
+def format_centered(figlet_str, width):
+    return "\n".join(line.center(width) for line in figlet_str.splitlines())
+
+# Collects the lines of a single frame and only emits a color escape when the color actually
+# changes, so a multi-line figlet block costs one SGR sequence instead of two per line.
+class Frame:
+    def __init__(self):
+        self.lines = []
+        self.color = None
+
+    def add(self, text, color=None):
+        if color != self.color:
+            text = (color or Style.RESET_ALL) + text
+            self.color = color
+        self.lines.append(text)
+
+    def render(self):
+        return "\n".join(self.lines) + (Style.RESET_ALL if self.color else "") + "\n"
+
+# FactoryTimestamp is always UTC in the fixed '%m/%d/%Y %I:%M:%S %p' format, so parse it
+# directly instead of going through the locale-aware strptime machinery.
+def parse_factory_timestamp(timestamp):
+    match = FACTORY_TIMESTAMP_RE.fullmatch(timestamp)
+    if match is None:
+        dt_utc = datetime.strptime(timestamp, '%m/%d/%Y %I:%M:%S %p').replace(tzinfo=UTC)
     else:
-        return Fore.RED
-
-def print_centered(figlet_str, width, color=None):
-    for line in figlet_str.splitlines():
-        output = line.center(width)
-        if color:
-            output = color + output + Style.RESET_ALL
-        print(output)
+        month, day, year, hour, minute, second, meridiem = match.groups()
+        hour = int(hour) % 12 + (12 if meridiem == "PM" else 0)
+        dt_utc = datetime(int(year), int(month), int(day), hour, int(minute), int(second), tzinfo=UTC)
+    return dt_utc.astimezone(CST)
+
+class Reading(NamedTuple):
+    value: int
+    factory_timestamp: str
+    cst_time_str: str
+
+def get_latest_timestamp(data):
+    if data and data.get("graphData"):
+        return data["graphData"][-1]["FactoryTimestamp"]
+    return None
+
+def get_latest_reading(data):
+    if not data or not data.get("graphData"):
+        return None
+    reading = data["graphData"][-1]
+    dt_cst = parse_factory_timestamp(reading["FactoryTimestamp"])
+    return Reading(
+        value=reading["Value"],
+        factory_timestamp=reading["FactoryTimestamp"],
+        cst_time_str=dt_cst.strftime('%Y-%m-%d %I:%M:%S %p %Z')
+    )
 
 def print_blood_sugar():
-    clear_console()
-    terminal_width = get_terminal_width()
-    title = pyfiglet.figlet_format("Blood Sugar Console", font="small")
-    print_centered(title, terminal_width)
-
-    if graph_data and "graphData" in graph_data and len(graph_data["graphData"]) > 0:
-        latest_reading = graph_data["graphData"][-1]
-        dt_utc = datetime.strptime(latest_reading["FactoryTimestamp"], '%m/%d/%Y %I:%M:%S %p')
-        dt_utc = dt_utc.replace(tzinfo=ZoneInfo("UTC"))
-        dt_cst = dt_utc.astimezone(ZoneInfo("America/Chicago"))
-        cst_time_str = dt_cst.strftime('%Y-%m-%d %I:%M:%S %p %Z')
-        value = latest_reading['Value']
-        color = get_blood_sugar_color(value)
-        value_fig = pyfiglet.figlet_format(str(value), font="big") 
-        print()
-        print_centered(value_fig, terminal_width, color)
-        print(f"This reading was captured at: {cst_time_str}.".center(terminal_width))
-    else:
-        print("\n".join([
-            "",
-            "Waiting for the applicaiton to fetch updated results ...".center(terminal_width),
-            ""
-        ]))
+    # Read the globals and build the frame under the lock, so a stale frame can never be written after a newer one.
+    with render_lock:
+        terminal_width = get_terminal_width()
+        frame = Frame()
+        frame.add(CLEAR_SCREEN + format_centered(TITLE, terminal_width))
+
+        reading = latest_reading
+        if reading is not None:
+            color = get_blood_sugar_color(reading.value)
+            value_fig = render_value(reading.value)
+            frame.add("")
+            frame.add(format_centered(value_fig, terminal_width), color)
+            frame.add(f"This reading was captured at: {reading.cst_time_str}.".center(terminal_width))
+        else:
+            frame.add("")
+            frame.add("Waiting for the applicaiton to fetch updated results ...".center(terminal_width))
+            frame.add("")
+
+        if status_message:
+            frame.add(status_message.center(terminal_width))
+
+        sys.stdout.write(frame.render())
+        sys.stdout.flush()
+
+def load_graph_data():
+    try:
+        with open(LAST_GRAPH_DATA_PATH, "r", encoding="utf-8") as cache_file:
+            data = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+# Failures are reported through status_message, which is drawn as part of the next frame;
+# a plain print() would be cleared straight away by that frame.
+def save_graph_data(data):
+    global status_message
+    try:
+        write_private_json(LAST_GRAPH_DATA_PATH, data)
+    except OSError as e:
+        status_message = f"Error saving graph data: {e}"
 
 def update_graph_data():
-    global graph_data
+    global latest_reading, status_message
     try:
-        graph_data = api.get_graph_data()
+        new_graph_data = api.get_graph_data()
     except LibreViewAPIError as e:
-        print("Error fetching graph data:", e)
+        status_message = f"Error fetching graph data: {e}"
+    else:
+        # A successful fetch clears any earlier error, which then needs a redraw to disappear.
+        cleared_status = status_message is not None
+        status_message = None
+        # A 304 from the API, or the sensor hasn't produced a new reading since the last render,
+        # so there is nothing to redraw.
+        timestamp = get_latest_timestamp(new_graph_data)
+        if new_graph_data is None or (latest_reading is not None and timestamp == latest_reading.factory_timestamp):
+            if cleared_status:
+                print_blood_sugar()
+            return
+        latest_reading = get_latest_reading(new_graph_data)
+        save_graph_data(new_graph_data)
     print_blood_sugar()
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(update_graph_data, 'interval', minutes=5)
-scheduler.start()
+update_terminal_width()
+if hasattr(signal, "SIGWINCH"):
+    threading.Thread(target=redraw_on_resize, daemon=True).start()
+    signal.signal(signal.SIGWINCH, handle_resize)
 
-update_graph_data()
+# Show the last known reading straight away while the first login and fetch are in flight.
+# A malformed cache file must not keep the app from starting, so it is simply ignored.
+try:
+    latest_reading = get_latest_reading(load_graph_data())
+except (KeyError, IndexError, TypeError, ValueError):
+    latest_reading = None
+print_blood_sugar()
 
+api = LibreViewAPI(EMAIL, PASSWORD)
+
+# A single periodic job doesn't need a scheduler: run it, then arm a timer for the next run.
+def refresh():
+    global refresh_timer
+    try:
+        if not hasattr(signal, "SIGWINCH"):
+            # update_graph_data() skips unchanged polls, so redraw here if only the width changed.
+            previous_width = get_terminal_width()
+            update_terminal_width()
+            if get_terminal_width() != previous_width:
+                print_blood_sugar()
+        update_graph_data()
+    finally:
+        if not stop_event.is_set():
+            refresh_timer = threading.Timer(REFRESH_INTERVAL_SECONDS, refresh)
+            refresh_timer.daemon = True
+            refresh_timer.start()
+
+refresh()
+
+# Park the main thread until Ctrl+C instead of waking it up every second. Windows has no
+# signal.pause(), but a long time.sleep() there is still interrupted immediately by Ctrl+C.
 try:
     while True:
-        time.sleep(1)
+        if hasattr(signal, "pause"):
+            signal.pause()
+        else:
+            time.sleep(3600)
 except (KeyboardInterrupt, SystemExit):
-    scheduler.shutdown()
\ No newline at end of file
+    stop_event.set()
+    if refresh_timer is not None:
+        refresh_timer.cancel()
\ No newline at end of file
@@ -1,15 +1,28 @@
 import requests
+import base64
 import hashlib
+import json
 import logging
+import orjson
+import os
+import ssl
+import time
 import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.ssl_ import create_urllib3_context
 from urllib3.exceptions import InsecureRequestWarning
 from typing import Optional, Dict, Any
+from local_cache import CACHE_DIR, write_private_json
 
 # --- Set up logging ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("LibreViewAPI")
 urllib3.disable_warnings(InsecureRequestWarning)
 
+# --- Local cache locations ---
+SESSION_CACHE_PATH: str = os.path.join(CACHE_DIR, "session.json")
+
 # --- Custom Exception Classes ---
 class LibreViewAPIError(Exception):
     """General error for LibreView API."""
@@ -27,28 +40,148 @@ class LibreViewResponseError(LibreViewAPIError):
     """Raised when a non-JSON or unexpected response is received."""
     pass
 
+class LibreViewHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that hands every connection pool the same pre-built SSLContext,
+    instead of letting urllib3 construct and configure a new one per pool.
+    """
+
+    def __init__(self, ssl_context: ssl.SSLContext, **kwargs: Any) -> None:
+        # HTTPAdapter.__init__ calls init_poolmanager, so the context must be set first.
+        self.ssl_context: ssl.SSLContext = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        kwargs["ssl_context"] = self.ssl_context
+        super().init_poolmanager(*args, **kwargs)
+
 class LibreViewAPI:
     """
     Handles authentication and data requests to the LibreView API.
     """
 
-    def __init__(self, email: str, password: str, default_version: str = "4.16.0", product: str = "llu.android", timeout: int = 10) -> None:
+    def __init__(self, email: str, password: str, default_version: str = "4.16.0", product: str = "llu.android", timeout: int = 10, session_cache_path: Optional[str] = SESSION_CACHE_PATH) -> None:
         self.email: str = email
         self.password: str = password
         self.default_version: str = default_version
         self.product: str = product
         self.timeout: int = timeout
+        self.connect_timeout: float = 3.05
+        self.session_cache_path: Optional[str] = session_cache_path
         self.token: Optional[str] = None
         self.account_id: Optional[str] = None
+        self.patient_id: Optional[str] = None
+        self._id_hash_cache: Dict[str, str] = {}
+        self.graph_validators: Dict[str, Dict[str, str]] = {}
         self.login_url: str = "https://api.libreview.io/llu/auth/login"
         self.account_url: str = "https://api-us.libreview.io/account"
-        self.session: requests.Session = requests.Session()
+        self.session: requests.Session = self.create_session()
         self.login_and_setup()
 
+    def create_session(self) -> requests.Session:
+        """
+        Builds a pooled session so the login, account, connections and graph
+        requests reuse the same keep-alive connections instead of paying a new
+        TCP + TLS handshake for every call.
+        """
+        session: requests.Session = requests.Session()
+        # Calls still pass verify=self.session.verify explicitly: requests lets REQUESTS_CA_BUNDLE /
+        # CURL_CA_BUNDLE override a session-level setting, but not a per-call one.
+        session.verify = False
+        # Built for CERT_NONE up front, so no trust store is loaded for a context that never verifies.
+        ssl_context: ssl.SSLContext = create_urllib3_context(cert_reqs=ssl.CERT_NONE)
+        retries: Retry = Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        adapter: HTTPAdapter = LibreViewHTTPAdapter(ssl_context, pool_connections=2, pool_maxsize=4, pool_block=True, max_retries=retries)
+        session.mount("https://api.libreview.io", adapter)
+        session.mount("https://api-us.libreview.io", adapter)
+        return session
+
     def login_and_setup(self) -> None:
-        """Authenticate and set up account id."""
+        """
+        Authenticate and set up account id.
+        A still-valid token cached by a previous run is reused instead of logging in again, and the
+        account id is only fetched from /account when it isn't already known.
+        """
+        if self.load_cached_session():
+            return
         self.login()
-        self.fetch_and_hash_account_id()
+        self.ensure_account_id()
+        self.save_cached_session()
+
+    def ensure_account_id(self) -> None:
+        """Fetches and hashes the account id, unless it has already been set up."""
+        if self.account_id is None:
+            self.fetch_and_hash_account_id()
+
+    def get_cache_key(self) -> str:
+        """Returns the key identifying this account in the session cache, without storing the email itself."""
+        return hashlib.blake2b(self.email.encode('utf-8'), digest_size=16).hexdigest()
+
+    @staticmethod
+    def get_token_expiry(token: Optional[str]) -> Optional[int]:
+        """
+        Returns the 'exp' claim of a JWT token, or None if it cannot be decoded.
+
+        Args:
+            token (str, optional): The bearer token returned by the login endpoint.
+        """
+        try:
+            payload: str = str(token).split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            return int(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+        except (IndexError, KeyError, TypeError, ValueError):
+            return None
+
+    def read_session_cache(self) -> Dict[str, Any]:
+        """Reads the session cache file, returning an empty cache if it is missing or unreadable."""
+        if not self.session_cache_path:
+            return {}
+        try:
+            with open(self.session_cache_path, "r", encoding="utf-8") as cache_file:
+                cache: Any = json.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Ignoring unreadable session cache: {ex}")
+            return {}
+        return cache if isinstance(cache, dict) else {}
+
+    def load_cached_session(self) -> bool:
+        """
+        Restores the token and account id from the session cache.
+        The account id is stable for an account, so it is restored even when the cached token has expired.
+
+        Returns:
+            bool: True if a cached, unexpired session was restored.
+        """
+        entry: Any = self.read_session_cache().get(self.get_cache_key())
+        if not isinstance(entry, dict):
+            return False
+        if entry.get("account_id"):
+            self.account_id = str(entry["account_id"])
+        token: Optional[str] = entry.get("token")
+        token_exp: Optional[int] = self.get_token_expiry(token)
+        if not self.account_id or token_exp is None or token_exp <= time.time() + 60:
+            logger.debug("No usable cached session found.")
+            return False
+        self.token = token
+        logger.debug(f"[SUCCESS]: Reusing the cached session for {self.email}.\n")
+        return True
+
+    def save_cached_session(self) -> None:
+        """Atomically writes the current token and account id to the session cache."""
+        if not self.session_cache_path or not self.token or not self.account_id:
+            return
+        cache: Dict[str, Any] = self.read_session_cache()
+        cache[self.get_cache_key()] = {
+            "token": self.token,
+            "token_exp": self.get_token_expiry(self.token),
+            "account_id": self.account_id
+        }
+        try:
+            write_private_json(self.session_cache_path, cache)
+        except OSError as ex:
+            logger.warning(f"Unable to write session cache: {ex}")
 
     def login(self) -> None:
         """Authenticate with the LibreView API and obtain a session token."""
@@ -59,7 +192,7 @@ class LibreViewAPI:
         headers: Dict[str, str] = self.get_headers(api_version=self.default_version, include_auth=False, include_account=False)
         headers["Content-Type"] = "application/json"
         try:
-            response: requests.Response = self.session.post(self.login_url, json=payload, headers=headers, verify=False, timeout=self.timeout)
+            response: requests.Response = self.session.post(self.login_url, json=payload, headers=headers, verify=self.session.verify, timeout=(self.connect_timeout, self.timeout))
         except requests.Timeout:
             logger.error("Login request timed out.")
             raise LibreViewTimeoutError("Login request timed out.")
@@ -67,11 +200,7 @@ class LibreViewAPI:
             logger.error(f"Unexpected error during login: {ex}")
             raise LibreViewAPIError(f"Unexpected error during login: {ex}")
 
-        try:
-            data: Dict[str, Any] = response.json()
-        except ValueError:
-            logger.error("Login response was not JSON.")
-            raise LibreViewResponseError("Login response was not JSON.")
+        data: Dict[str, Any] = self.parse_json(response, "Login")
 
         if response.status_code == 401:
             logger.error("Authentication failed: Invalid credentials.")
@@ -89,7 +218,7 @@ class LibreViewAPI:
         """
         headers: Dict[str, str] = self.get_headers(api_version="4.7", include_auth=True, include_account=False)
         try:
-            response: requests.Response = self.session.get(self.account_url, headers=headers, verify=False, timeout=self.timeout)
+            response: requests.Response = self.session.get(self.account_url, headers=headers, verify=self.session.verify, timeout=(self.connect_timeout, self.timeout))
         except requests.Timeout:
             logger.error("Account ID request timed out.")
             raise LibreViewTimeoutError("Account ID request timed out.")
@@ -97,19 +226,39 @@ class LibreViewAPI:
             logger.error(f"Unexpected error fetching account id: {ex}")
             raise LibreViewAPIError(f"Unexpected error fetching account id: {ex}")
 
-        try:
-            data: Dict[str, Any] = response.json()
-        except ValueError:
-            logger.error("Account ID response was not JSON.")
-            raise LibreViewResponseError("Account ID response was not JSON.")
+        data: Dict[str, Any] = self.parse_json(response, "Account ID")
 
         if response.status_code != 200 or "data" not in data:
             logger.error(f"Failed to get account data: {data}")
             raise LibreViewAPIError(f"Failed to get account data: {data}")
         raw_id: str = str(data["data"]["user"]["id"])
-        self.account_id = hashlib.sha256(raw_id.encode('utf-8')).hexdigest()
+        account_id: Optional[str] = self._id_hash_cache.get(raw_id)
+        if account_id is None:
+            # LibreView checks Account-Id against the SHA-256 hex digest of the user id, so a cheaper
+            # digest such as BLAKE2b is not interchangeable here.
+            account_id = hashlib.sha256(raw_id.encode('utf-8')).hexdigest()
+            self._id_hash_cache[raw_id] = account_id
+        self.account_id = account_id
         logger.debug(f"[SUCCESS]: Retrieved the Account-Id: '{raw_id}' and calculated the SHA256 hash: {self.account_id} for future API requests.\n")
 
+    @staticmethod
+    def parse_json(response: requests.Response, description: str) -> Any:
+        """
+        Decodes a JSON response body with orjson.
+
+        Args:
+            response (requests.Response): The response to decode.
+            description (str): Name of the response used in error messages.
+
+        Raises:
+            LibreViewResponseError: If the body is not valid JSON.
+        """
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            logger.error(f"{description} response was not JSON.")
+            raise LibreViewResponseError(f"{description} response was not JSON.")
+
     def get_headers(self, api_version: Optional[str] = None, include_auth: bool = True, include_account: bool = True) -> Dict[str, str]:
         """
         Returns headers for requests. Allows specifying API version.
@@ -123,7 +272,9 @@ class LibreViewAPI:
         headers: Dict[str, str] = {
             "version": version,
             "product": self.product,
-            "Accept": "application/json"
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip",
+            "Connection": "keep-alive"
         }
         if include_auth and self.token:
             headers["Authorization"] = f"Bearer {self.token}"
@@ -145,12 +296,11 @@ class LibreViewAPI:
         Returns:
             Response object.
         """
+        extra_headers: Dict[str, str] = kwargs.pop("headers", None) or {}
         headers: Dict[str, str] = self.get_headers(api_version=api_version)
-        if "headers" in kwargs:
-            headers.update(kwargs["headers"])
-            kwargs.pop("headers")
+        headers.update(extra_headers)
         try:
-            response: requests.Response = self.session.request(method, url, headers=headers, timeout=self.timeout, verify=False, **kwargs)
+            response: requests.Response = self.session.request(method, url, headers=headers, verify=self.session.verify, timeout=(self.connect_timeout, self.timeout), **kwargs)
         except requests.Timeout:
             logger.error(f"Request to {url} timed out.")
             raise LibreViewTimeoutError(f"Request to {url} timed out.")
@@ -160,10 +310,13 @@ class LibreViewAPI:
 
         if response.status_code == 401:
             logger.warning("Token expired or invalid. Refreshing...")
-            self.login_and_setup()
+            # Only the token rotates; the hashed account id stays valid across logins.
+            self.login()
+            self.save_cached_session()
             headers = self.get_headers(api_version=api_version)
+            headers.update(extra_headers)
             try:
-                response = self.session.request(method, url, headers=headers, timeout=self.timeout, verify=False, **kwargs)
+                response = self.session.request(method, url, headers=headers, verify=self.session.verify, timeout=(self.connect_timeout, self.timeout), **kwargs)
             except requests.Timeout:
                 logger.error(f"Retry request to {url} timed out.")
                 raise LibreViewTimeoutError(f"Retry request to {url} timed out.")
@@ -181,11 +334,7 @@ class LibreViewAPI:
         """
         url = "https://api.libreview.io/llu/connections"
         response = self.request("GET", url)
-        try:
-            connections = response.json()
-        except ValueError:
-            logger.error("Connections response was not JSON.")
-            raise LibreViewResponseError("Connections response was not JSON.")
+        connections = self.parse_json(response, "Connections")
 
         data = connections.get("data")
         if not data or not isinstance(data, list) or len(data) == 0:
@@ -196,39 +345,56 @@ class LibreViewAPI:
             return None
         return data[0].get("patientId")
 
-    def get_graph_data(self, patientId: Optional[str] = None, api_version: str = "4.16.0") -> Dict[str, Any]:
+    def get_graph_data(self, patientId: Optional[str] = None, api_version: str = "4.16.0") -> Optional[Dict[str, Any]]:
         """
         Query the /graph endpoint for a specific connection.
         If no patientId is provided, it will attempt to fetch it using get_patient_id.
+        The fetched patientId is remembered, so subsequent polls only issue the /graph request.
+        Repeated polls are sent as conditional requests using the ETag / Last-Modified of the previous response.
 
         Args:
             patientId (str, optional): The patient's ID. If not provided, it will be fetched automatically.
             api_version (str, optional): API version to use. Defaults to "4.16.0".
 
         Returns:
-            dict: Graph data and metadata.
+            Optional[dict]: Graph data and metadata, or None if it has not changed since the previous call.
 
         Raises:
             LibreViewAPIError: If no graph data is returned or patientId cannot be determined.
         """
+        if patientId is None:
+            patientId = self.patient_id
         if patientId is None:
             logger.debug("No patientId provided. Attempting to fetch the first patientId.")
             patientId = self.get_patient_id()
             if patientId is None:
                 logger.error("Unable to fetch patientId. Cannot proceed with get_graph_data.")
                 raise LibreViewAPIError("No patientId available to query graph data.")
+            self.patient_id = patientId
 
         url: str = f"https://api.libreview.io/llu/connections/{patientId}/graph"
-        response: requests.Response = self.request("GET", url, api_version=api_version)
+        validators: Dict[str, str] = self.graph_validators.get(url, {})
+        conditional_headers: Dict[str, str] = {}
+        if "ETag" in validators:
+            conditional_headers["If-None-Match"] = validators["ETag"]
+        if "Last-Modified" in validators:
+            conditional_headers["If-Modified-Since"] = validators["Last-Modified"]
+        response: requests.Response = self.request("GET", url, api_version=api_version, headers=conditional_headers)
 
-        try:
-            data: Dict[str, Any] = response.json()
-        except ValueError:
-            logger.error("Graph data response was not JSON.")
-            raise LibreViewResponseError("Graph data response was not JSON.")
+        if response.status_code == 304:
+            logger.debug("Graph data has not changed since the previous request.")
+            return None
+
+        data: Dict[str, Any] = self.parse_json(response, "Graph data")
 
         if "data" not in data:
+            # The cached connection may no longer be valid; rediscover it on the next poll.
+            self.patient_id = None
+            self.graph_validators.pop(url, None)
             logger.error(f"No graph data returned: {data}")
             raise LibreViewAPIError(f"No graph data returned: {data}")
 
+        self.graph_validators[url] = {
+            name: response.headers[name] for name in ("ETag", "Last-Modified") if name in response.headers
+        }
         return data["data"]
\ No newline at end of file
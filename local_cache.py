@@ -0,0 +1,25 @@
+import json
+import os
+from typing import Any
+
+# --- Local cache locations ---
+CACHE_DIR: str = os.path.join(os.path.expanduser("~"), ".cache", "blood-sugar")
+
+def write_private_json(path: str, data: Any) -> None:
+    """
+    Atomically writes data as JSON to a file readable by the current user only.
+    The cache files hold a bearer token and glucose history, so they must not use the default umask.
+
+    Args:
+        path (str): Destination file; its directory is created if missing.
+        data (Any): JSON-serializable data to write.
+
+    Raises:
+        OSError: If the file cannot be written.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path: str = f"{path}.tmp"
+    fd: int = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as cache_file:
+        json.dump(data, cache_file)
+    os.replace(tmp_path, path)